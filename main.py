@@ -2,98 +2,357 @@
 # SPDX-FileCopyrightText: Copyright (c) 2020-2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
 # SPDX-License-Identifier: Apache-2.0
 
+import argparse
+import http.client
+import ipaddress
+import json
+import os
 import platform
+import signal
+import socket
 import subprocess
 import sys
-import os
-import typer
-import numpy as np
-from typing_extensions import Annotated
+import time
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+
+_stdout_write = sys.stdout.write
+
+TAILSCALED_SOCKET = "/var/run/tailscale/tailscaled.sock"
+PUBLIC_IP_URLS = (
+    # IPv4-only endpoints, so the advertised address family doesn't depend
+    # on which provider answers first
+    "https://api.ipify.org",
+    "https://ipv4.icanhazip.com",
+    "https://v4.ident.me",
+)
+PUBLIC_IP_CACHE = os.path.expanduser("~/.cache/easyreach/pubip.json")
+PUBLIC_IP_CACHE_TTL = 3600  # seconds
+TARGET_FPS = 60
+# Physics runs in fixed substeps within each rendered frame
+PHYSICS_HZ = 240
+
+# Target cube placed in front of the robot
+CUBE_POSITION = (0.5, 0.0, 0.3)
+CUBE_SCALE = (0.05, 0.05, 0.05)
+CUBE_COLOR = (1.0, 0.0, 0.0)  # Red cube
+
+_ARM64 = frozenset({"aarch64", "arm64"})
+_IS_ARM64 = platform.machine().lower() in _ARM64
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix domain socket."""
+
+    def __init__(self, path: str, timeout: float = 2):
+        super().__init__("local-tailscaled.sock", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def _is_valid_ip(ip: str, version: Optional[int] = None) -> bool:
+    """Return True if ``ip`` is a well-formed IP address string.
+
+    If ``version`` is given (4 or 6), the address must also be of that family.
+    """
+    if not isinstance(ip, str):
+        return False
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return version is None or addr.version == version
+
+
+def _get_tailscale_ip() -> str:
+    """Return this node's Tailscale IPv4 address.
+
+    Queries the tailscaled LocalAPI directly and falls back to the
+    ``tailscale`` CLI when the socket is unavailable (e.g. on macOS) or
+    returns an unexpected response.
+    """
+    conn = _UnixHTTPConnection(TAILSCALED_SOCKET)
+    try:
+        conn.request("GET", "/localapi/v0/status?peers=false")
+        resp = conn.getresponse()
+        body = resp.read()
+        if resp.status == 200:
+            status = json.loads(body)
+            node = status.get("Self") if isinstance(status, dict) else None
+            ips = node.get("TailscaleIPs") if isinstance(node, dict) else None
+            if isinstance(ips, list):
+                return next((ip for ip in ips if _is_valid_ip(ip, version=4)), "")
+    except (OSError, ValueError, http.client.HTTPException):
+        pass
+    finally:
+        conn.close()
+
+    return _run_tailscale_cli(["tailscale", "ip", "-4"])
+
+
+def _run_tailscale_cli(argv: list) -> str:
+    """Run the tailscale CLI and return its stripped stdout.
+
+    Uses posix_spawn where available so the child doesn't fork (and
+    copy the page tables of) this process.
+    """
+    if not hasattr(os, "posix_spawnp"):
+        result = subprocess.run(argv, capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+
+    r_fd, w_fd = os.pipe()
+    try:
+        pid = os.posix_spawnp(
+            argv[0],
+            argv,
+            os.environ,
+            file_actions=[
+                (os.POSIX_SPAWN_DUP2, w_fd, 1),
+                (os.POSIX_SPAWN_OPEN, 2, os.devnull, os.O_WRONLY, 0),
+            ],
+        )
+    except BaseException:
+        os.close(r_fd)
+        raise
+    finally:
+        os.close(w_fd)
+
+    with os.fdopen(r_fd, "rb") as pipe:
+        output = pipe.read()
+    returncode = os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, argv, output)
+    return output.decode().strip()
+
+
+def _get_gateway_mac() -> Optional[str]:
+    """Return the MAC address of the default-route gateway, if known."""
+    try:
+        with open("/proc/net/route") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if fields[1] == "00000000":
+                    gateway = ".".join(str(b) for b in bytes.fromhex(fields[2])[::-1])
+                    break
+            else:
+                return None
+        with open("/proc/net/arp") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if fields[0] != gateway:
+                    continue
+                # Incomplete entries (ATF_COM unset) carry an all-zero MAC
+                # that every unresolved network would share
+                mac = fields[3]
+                if not int(fields[2], 16) & 0x2 or mac == "00:00:00:00:00:00":
+                    return None
+                return mac
+    except (OSError, StopIteration, IndexError, ValueError):
+        pass
+    return None
+
+
+def _fetch_ip_from(url: str) -> str:
+    """Query a single IP echo service over HTTPS.
+
+    Any failure is raised as ``OSError`` so callers only need one handler.
+    """
+    try:
+        with urllib.request.urlopen(url, timeout=3) as r:
+            ip = r.read().decode().strip()
+    except (http.client.HTTPException, ValueError) as e:
+        raise OSError(f"Bad response from {url}: {e!r}") from e
+    if not _is_valid_ip(ip, version=4):
+        raise OSError(f"Invalid response from {url}: {ip[:64]!r}")
+    return ip
+
+
+def _fetch_public_ip() -> str:
+    """Query all IP echo services at once and return the first answer."""
+    pool = ThreadPoolExecutor(max_workers=len(PUBLIC_IP_URLS))
+    pending = {pool.submit(_fetch_ip_from, url) for url in PUBLIC_IP_URLS}
+    error = None
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except OSError as e:
+                    error = e
+        raise error
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _get_public_ip() -> str:
+    """Return the public IP, reusing the on-disk cache for the same network."""
+    gateway_mac = _get_gateway_mac()
+
+    if gateway_mac:
+        try:
+            with open(PUBLIC_IP_CACHE) as f:
+                cached = json.load(f)
+            if (
+                cached["gateway_mac"] == gateway_mac
+                and time.time() - cached["ts"] < PUBLIC_IP_CACHE_TTL
+                and _is_valid_ip(cached["ip"], version=4)
+            ):
+                return cached["ip"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    ip = _fetch_public_ip()
+
+    if gateway_mac and ip:
+        try:
+            os.makedirs(os.path.dirname(PUBLIC_IP_CACHE), exist_ok=True)
+            tmp_path = f"{PUBLIC_IP_CACHE}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(
+                        {"gateway_mac": gateway_mac, "ip": ip, "ts": time.time()}, f
+                    )
+                os.replace(tmp_path, PUBLIC_IP_CACHE)
+            except OSError:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            pass
+
+    return ip
 
 
 def get_ip_address(use_tailscale: bool = False) -> str:
     """Detect IP address using either Tailscale or public IP."""
-    print("Detecting IP address...")
+    _stdout_write("Detecting IP address...\n")
 
     if use_tailscale:
         try:
-            result = subprocess.run(
-                ["tailscale", "ip", "-4"], capture_output=True, text=True, check=True
-            )
-            ip = result.stdout.strip()
-            if not ip:
-                print("Error: Could not detect Tailscale IP. Is Tailscale running?")
+            ip = _get_tailscale_ip()
+            if not _is_valid_ip(ip):
+                _stdout_write(
+                    "Error: Could not detect Tailscale IP. Is Tailscale running?\n"
+                )
                 sys.exit(1)
-            print(f"Detected Tailscale IP: {ip}")
+            _stdout_write(f"Detected Tailscale IP: {ip}\n")
             return ip
         except FileNotFoundError:
-            print("Error: tailscale command not found. Please install Tailscale.")
+            _stdout_write(
+                "Error: tailscale command not found. Please install Tailscale.\n"
+            )
             sys.exit(1)
         except subprocess.CalledProcessError as e:
-            print(f"Error running tailscale command: {e}")
+            _stdout_write(f"Error running tailscale command: {e}\n")
             sys.exit(1)
     else:
         try:
-            result = subprocess.run(
-                ["curl", "-s", "ifconfig.me"],
-                capture_output=True,
-                text=True,
-                check=True,
-                timeout=10,
-            )
-            ip = result.stdout.strip()
-            if not ip:
-                print("Error: Could not detect public IP")
+            ip = _get_public_ip()
+            if not _is_valid_ip(ip, version=4):
+                _stdout_write("Error: Could not detect public IP\n")
                 sys.exit(1)
-            print(f"Detected public IP: {ip}")
+            _stdout_write(f"Detected public IP: {ip}\n")
             return ip
-        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
-            print(f"Error detecting public IP: {e}")
+        except OSError as e:
+            _stdout_write(f"Error detecting public IP: {e}\n")
             sys.exit(1)
 
 
-# Initialize Typer app
-app = typer.Typer(
-    help="Run Isaac Sim with livestream capabilities",
-    add_completion=False,
-    rich_markup_mode="rich",
-)
+_CONNECTION_BANNER = "\n".join(
+    [
+        "",
+        "╔════════════════════════════════════════════════════════════╗",
+        "║                                                            ║",
+        "║       Isaac Sim is Ready!                                  ║",
+        "║                                                            ║",
+        "║  Connect using Isaac Sim WebRTC Streaming Client:          ║",
+        "║                                                            ║",
+        "║  IP Address:  {ip:<44} ║",
+        "║  Port:        {port:<44} ║",
+        "║                                                            ║",
+        "╚════════════════════════════════════════════════════════════╝",
+        "",
+        "",
+    ]
+).format
 
 
 def print_connection_info(ip: str, port: int):
     """Print connection information in a formatted box."""
-    print()
-    print("╔════════════════════════════════════════════════════════════╗")
-    print("║                                                            ║")
-    print("║       Isaac Sim is Ready!                                  ║")
-    print("║                                                            ║")
-    print("║  Connect using Isaac Sim WebRTC Streaming Client:          ║")
-    print("║                                                            ║")
-    print(f"║  IP Address:  {ip:<44} ║")
-    print(f"║  Port:        {port:<44} ║")
-    print("║                                                            ║")
-    print("╚════════════════════════════════════════════════════════════╝")
-    print()
+    sys.stdout.write(_CONNECTION_BANNER(ip=ip, port=port))
+    sys.stdout.flush()
 
 
-@app.command()
-def main(
-    port: Annotated[int, typer.Option(help="TCP port for streaming")] = 49100,
-    gpu: Annotated[int, typer.Option(help="GPU to use for rendering")] = 0,
-    tailscale: Annotated[
-        bool, typer.Option(help="Use Tailscale IP instead of public IP")
-    ] = False,
-):
-    """
-    Run Isaac Sim with livestream capabilities.
+def _check_cuda_device(gpu: int):
+    """Fail fast if CUDA doesn't see exactly the one GPU that was selected.
+
+    With CUDA_VISIBLE_DEVICES set to a single index, CUDA should report
+    exactly one device. Zero means ``gpu`` is out of range; more than one
+    means CUDA was initialised before the variable was set, so it was
+    ignored. On a single-GPU machine the second case can't be told apart,
+    but there is also no other GPU to pick by mistake.
 
-    Examples:
-        python main.py                          # Run with defaults
-        python main.py --port 8080 --gpu 1      # Custom port and GPU
-        python main.py --tailscale              # Use Tailscale IP
+    Only checked when cuda-python is installed; otherwise a bad GPU index
+    surfaces once Isaac Sim boots.
     """
+    try:
+        from cuda.bindings import driver as cuda
+    except ImportError:
+        try:
+            from cuda import cuda
+        except ImportError:
+            return
+
+    (err,) = cuda.cuInit(0)
+    if err != cuda.CUresult.CUDA_SUCCESS:
+        print(f"Error: Could not initialise CUDA for GPU {gpu} ({err}).")
+        sys.exit(1)
+
+    err, count = cuda.cuDeviceGetCount()
+    if err != cuda.CUresult.CUDA_SUCCESS or count == 0:
+        print(f"Error: GPU {gpu} is not available to CUDA ({err}).")
+        sys.exit(1)
+    if count != 1:
+        print(
+            f"Error: CUDA sees {count} GPUs instead of only GPU {gpu}; "
+            "CUDA_VISIBLE_DEVICES was set after CUDA had been initialised."
+        )
+        sys.exit(1)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Run Isaac Sim with livestream capabilities.",
+        epilog="""examples:
+  python main.py                          # Run with defaults
+  python main.py --port 8080 --gpu 1      # Custom port and GPU
+  python main.py --tailscale              # Use Tailscale IP""",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--port", type=int, default=49100, help="TCP port for streaming"
+    )
+    parser.add_argument("--gpu", type=int, default=0, help="GPU to use for rendering")
+    parser.add_argument(
+        "--tailscale",
+        action="store_true",
+        help="Use Tailscale IP instead of public IP",
+    )
+    return parser.parse_args(argv)
+
+
+def main(port: int = 49100, gpu: int = 0, tailscale: bool = False):
+    """Run Isaac Sim with livestream capabilities."""
     # Exit early if running on ARM64 (aarch64) architecture
-    if platform.machine().lower() in ["aarch64", "arm64"]:
+    if _IS_ARM64:
         print("Livestream is not supported on ARM64 architecture. Exiting.")
         sys.exit(0)
 
@@ -102,6 +361,7 @@ def main(
 
     # Set GPU environment variable
     os.environ["CUDA_VISIBLE_DEVICES"] = str(gpu)
+    _check_cuda_device(gpu)
 
     print()
     print("Starting Isaac Sim with livestream...")
@@ -128,21 +388,31 @@ def main(
     # Start the omniverse application
     kit = SimulationApp(launch_config=CONFIG)
 
-    from isaacsim.core.utils.extensions import enable_extension
-
-    # Configure livestream settings
-    kit.set_setting("/app/window/drawMouse", True)
-    kit.set_setting("/app/livestream/publicEndpointAddress", endpoint_ip)
-    kit.set_setting("/app/livestream/port", port)
-    kit.set_setting("/renderer/multiGpu/Enabled", False)
-    kit.set_setting("/renderer/activeGpu", gpu)
-
-    # Enable Livestream extension
-    enable_extension("omni.services.livestream.nvcf")
-
-    # Enable the layers and stage windows in the UI
-    enable_extension("omni.kit.widget.stage")
-    enable_extension("omni.kit.widget.layers")
+    import carb
+    import omni.kit.app
+
+    # Configure livestream and render settings through a single settings handle
+    settings = carb.settings.get_settings()
+    for path, value in {
+        "/app/window/drawMouse": True,
+        "/app/livestream/publicEndpointAddress": endpoint_ip,
+        "/app/livestream/port": port,
+        "/renderer/multiGpu/Enabled": False,
+        "/renderer/activeGpu": gpu,
+        # The 1280x720 stream can't resolve DLSS quality modes; use Performance
+        "/rtx/post/dlss/execMode": 0,
+    }.items():
+        settings.set(path, value)
+
+    # Enable the livestream extension plus the layers and stage windows in the
+    # UI. The requests are queued and resolved together on the next update.
+    ext_manager = omni.kit.app.get_app().get_extension_manager()
+    for ext_name in (
+        "omni.services.livestream.nvcf",
+        "omni.kit.widget.stage",
+        "omni.kit.widget.layers",
+    ):
+        ext_manager.set_extension_enabled(ext_name, True)
 
     kit.update()
 
@@ -153,11 +423,16 @@ def main(
     from isaacsim.core.utils.stage import add_reference_to_stage
     from isaacsim.storage.native import get_assets_root_path
     from isaacsim.core.api.objects import DynamicCuboid
+    import numpy as np
 
     print("Setting up robot simulation...")
 
     # Create world
-    world = World(stage_units_in_meters=1.0)
+    world = World(
+        stage_units_in_meters=1.0,
+        physics_dt=1.0 / PHYSICS_HZ,
+        rendering_dt=1.0 / TARGET_FPS,
+    )
     world.scene.add_default_ground_plane()
 
     # Add Franka robot
@@ -172,9 +447,9 @@ def main(
         DynamicCuboid(
             prim_path="/World/Cube",
             name="target_cube",
-            position=np.array([0.5, 0.0, 0.3]),
-            scale=np.array([0.05, 0.05, 0.05]),
-            color=np.array([1.0, 0.0, 0.0]),  # Red cube
+            position=np.asarray(CUBE_POSITION, dtype=np.float64),
+            scale=np.asarray(CUBE_SCALE, dtype=np.float64),
+            color=np.asarray(CUBE_COLOR, dtype=np.float64),
         )
     )
 
@@ -183,16 +458,33 @@ def main(
 
     print("Robot setup complete!")
     print("  - Franka Panda robot added at /World/Franka")
-    print("  - Red cube added at [0.5, 0.0, 0.3]")
+    print(f"  - Red cube added at {list(CUBE_POSITION)}")
 
     # Print connection info
     print_connection_info(endpoint_ip, port)
 
-    # Run until closed
+    # Ctrl+C only sets a flag, checked once per frame. The handler must not
+    # take any lock: it runs on the main thread between bytecodes, possibly
+    # while that thread already holds the lock.
+    shutdown = [False]
+
+    def _on_sigint(*_):
+        shutdown[0] = True
+
+    previous_sigint = signal.signal(signal.SIGINT, _on_sigint)
+
+    # Run until closed, sleeping off whatever is left of each frame's budget
+    # instead of spinning as fast as the renderer allows
+    frame_time = 1.0 / TARGET_FPS
+    next_frame = time.monotonic()
+    is_running = kit._app.is_running
+    is_exiting = kit.is_exiting
+    step = world.step
     try:
-        while kit._app.is_running() and not kit.is_exiting():
-            # Step the world (this calls kit.update internally)
-            world.step(render=True)
+        while not shutdown[0] and is_running() and not is_exiting():
+            # Step the world. This calls kit.update, which renders one frame
+            # and advances physics by rendering_dt in physics_dt substeps.
+            step(render=True)
 
             # Your custom code can go here:
             # - Get robot observations
@@ -200,12 +492,22 @@ def main(
             # - Run control logic
             # etc.
 
-    except KeyboardInterrupt:
-        print("\nShutting down Isaac Sim...")
+            next_frame += frame_time
+            remaining = next_frame - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            else:
+                # Running behind; don't try to catch up with a burst of frames
+                next_frame = time.monotonic()
+
+        if shutdown[0]:
+            print("\nShutting down Isaac Sim...")
     finally:
+        signal.signal(signal.SIGINT, previous_sigint)
         kit.close()
         print("Isaac Sim closed successfully.")
 
 
 if __name__ == "__main__":
-    app()
+    args = parse_args()
+    main(port=args.port, gpu=args.gpu, tailscale=args.tailscale)